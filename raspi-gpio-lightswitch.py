@@ -8,6 +8,11 @@ __date__ = "07/06/2024"
 
 """Configurable python service to run on Raspberry Pi
    and evaluate one GPIO-in to control one GPIO-out as light switch.
+
+   The service is latency-bound, not compute-bound: the only hot path is
+   button event -> handleButtonEvent -> table look-up -> action -> one GPIO write.
+   It runs in a GPIO Zero event thread, while the main thread sleeps until SIGTERM.
+   Relevant measures are event latency, idle CPU usage and state file writes.
 """
 
 #    Copyright 2022-2024 Michael Heise (mikiair)
@@ -25,17 +30,24 @@ __date__ = "07/06/2024"
 #    limitations under the License.
 
 # standard imports
+import array
 import configparser
 import logging
-import pathlib
+import logging.handlers
+import os
+import queue
 import signal
 import sys
-import time
-import weakref
+import threading
 
 # 3rd party imports
 import gpiozero
-from systemd.journal import JournalHandler
+
+try:
+    from systemd.journal import JournalHandler
+except ImportError:
+    # allow running outside systemd, e.g. for development
+    JournalHandler = None
 
 # local imports
 # - none -
@@ -46,121 +58,223 @@ class RaspiGPIOLightSwitch:
     through a switch connected to GPIOs on Raspberry.
     """
 
+    # fixed set of instance attributes, avoids per-instance __dict__
+    __slots__ = (
+        "isValidGPIO",
+        "configGPIO",
+        "_log",
+        "_debug",
+        "_pinFactory",
+        "_buttonPin",
+        "_pud",
+        "_active",
+        "_eventMode",
+        "_bouncetime",
+        "_dimMode",
+        "_dimLevels",
+        "_dimStep",
+        "_dimDirStr",
+        "_dimIndex",
+        "_dimValues",
+        "_dimHoldSec",
+        "_linExp",
+        "_button",
+        "_light",
+        "_transitions",
+        "_stateActions",
+        "_current_state",
+        "_stateTimer",
+        "_logListener",
+    )
+
     CONFIGFILE = "/etc/raspi-gpio-lightswitch.conf"
     STATEFILE = "/home/pi/.raspi-gpio-lightswitch.state"
-
-    VALUES_PULLUPDN = ["up", "dn", "upex", "dnex"]
-    VALUES_PRESS_RELEASE = ["press", "release", "press_release", "release_press"]
-    VALUES_DIMUPDN = ["up", "dn"]
+    JOURNAL_SOCKET = "/run/systemd/journal/socket"
+    # mandatory options in [GPIO] section of the config file
+    REQUIRED_OPTIONS = ("button", "light")
+    # delay in seconds after the hold time before writing the state file
+    STATEFILE_DELAY = 0.5
+
+    # highest BCM GPIO number on the Raspberry Pi header
+    MAX_GPIO = 27
+    # maximum button bounce time in milliseconds (limit of pigpio glitch filter)
+    MAX_BOUNCETIME = 300
+
+    # valid configuration strings with their respective index
+    VALUES_PULLUPDN = {"up": 0, "dn": 1, "upex": 2, "dnex": 3}
+    VALUES_PRESS_RELEASE = {
+        "press": 0,
+        "release": 1,
+        "press_release": 2,
+        "release_press": 3,
+    }
+    VALUES_DIMUPDN = {"up": 0, "dn": 1}
+
+    # GPIO Zero pull_up and active_state parameters by pull resistor index
+    PUD_ACTIVE = ((True, None), (False, None), (None, False), (None, True))
 
     # state transition matrix by dimMode, eventMode, and source status
     # dictionary keys - source / values - target
     # 0: Off-r / 1: On-p / 2: On-r / 3: Off-p / 4: On-p2 / 5: Off-p2 / 6: On-h / 7: Off-h
-    STATES = [
-        [
+    STATES = (
+        (
             ({1: 2, 3: 0}, {0: 1, 2: 3}),
             ({1: 0, 3: 2}, {0: 3, 2: 1}),
             ({1: 2, 4: 0}, {0: 1, 2: 4}),
             ({3: 2, 5: 0}, {0: 3, 2: 5}),
-        ],
-        [
+        ),
+        (
             ({1: 2, 3: 0}, {0: 1, 2: 9}),
             ({1: 9, 3: 2}, {0: 3, 2: 1}),
             ({1: 2, 4: 0}, {0: 1, 2: 9}),
             ({1: 2, 3: 2, 5: 0}, {0: 3, 2: 9}),
-        ],
-        [
+        ),
+        (
             ({1: 2, 3: 0, 6: 2, 7: 0}, {0: 1, 2: 3}, {1: 6, 3: 7, 6: 6, 7: 7}),
             ({1: 0, 3: 2, 6: 2}, {0: 3, 2: 1}, {1: 6, 3: 6, 6: 6}),
             ({1: 2, 4: 0, 6: 2}, {0: 1, 2: 4}, {1: 6, 4: 6, 6: 6}),
             ({3: 2, 5: 0, 6: 2, 7: 0}, {0: 3, 2: 5}, {3: 6, 5: 7, 6: 6, 7: 7}),
-        ],
-    ]
+        ),
+    )
 
     # action matrix by dimMode, eventMode, and target status
     # -1 - no action / 0 - light off / 1 - light on, restore / 2 - dim up/dn / None - undefined
-    ACTIONS = [
-        [
+    ACTIONS = (
+        (
             (-1, 1, -1, 0, None, None, None, None),
             (0, -1, 1, -1, None, None, None, None),
             (0, 1, -1, None, -1, None, None, None),
             (-1, None, 1, -1, None, 0, None, None),
-        ],
-        [
+        ),
+        (
             (-1, 2, -1, 0, None, None, None, None),
             (0, -1, 2, -1, None, None, None, None),
             (0, 2, -1, None, -1, None, None, None),
             (-1, -1, 2, -1, None, 0, None, None),
-        ],
-        [
+        ),
+        (
             (-1, 1, -1, 0, None, None, 2, -1),
             (0, -1, 1, -1, None, None, 2, None),
             (0, 1, -1, None, -1, None, 2, None),
             (-1, None, 1, -1, None, 0, 2, -1),
-        ],
-    ]
+        ),
+    )
 
     EVENT_RELEASE = 0
     EVENT_PRESS = 1
     EVENT_HOLD = 2
 
+    # dimensions of the flat transition table (-1 - undefined transition)
+    NUM_STATES = 8
+    NUM_EVENTS = 3
+
     def __init__(self):
         """Initialize service class."""
-        self._finalizer = weakref.finalize(self, self.finalize)
-        self.isValidGPIO = False
-        self.config = None
-
-    def remove(self):
-        """Call finalizer before removing class instance."""
-        self._finalizer()
-
-    @property
-    def removed(self):
-        return not self._finalizer.alive
-
-    def finalize(self):
-        """Set valid state to false."""
         self.isValidGPIO = False
+        self.configGPIO = {}
+        self._stateTimer = None
+        self._logListener = None
 
     def initLogging(self, log):
-        """Initialize logging to journal."""
+        """Initialize logging to journal, or to stderr if journald is not available."""
         log_fmt = logging.Formatter("%(levelname)s %(message)s")
-        logHandler = JournalHandler()
+        if JournalHandler is not None and os.path.exists(self.JOURNAL_SOCKET):
+            logHandler = JournalHandler()
+        else:
+            logHandler = logging.StreamHandler()
         logHandler.setFormatter(log_fmt)
-        log.addHandler(logHandler)
+        # only queue records in the calling (GPIO event) thread,
+        # and send them to the journal from a separate listener thread
+        logQueue = queue.SimpleQueue()
+        log.addHandler(logging.handlers.QueueHandler(logQueue))
+        self._logListener = logging.handlers.QueueListener(logQueue, logHandler)
+        self._logListener.start()
         log.setLevel(logging.INFO)
         # log.setLevel(logging.DEBUG)
         self._log = log
+        # level is fixed, so check once whether debug output is needed on events
+        self._debug = log.isEnabledFor(logging.DEBUG)
         self._log.info("Initialized logging.")
-
-        pinf = type(gpiozero.Device._default_pin_factory()).__name__
-        self._log.info(f"GPIO Zero default pin factory: {pinf}")
         return
 
+    def stopLogging(self):
+        """Send all queued log records to the journal and stop the listener."""
+        if self._logListener is not None:
+            self._logListener.stop()
+            self._logListener = None
+
+    def initPinFactory(self):
+        """Create the pin factory used for all devices.
+        Prefer pigpio unless a factory is selected by GPIOZERO_PIN_FACTORY,
+        and fall back to the GPIO Zero default if pigpiod is not available.
+        """
+        self._pinFactory = None
+        if not os.environ.get("GPIOZERO_PIN_FACTORY"):
+            try:
+                from gpiozero.pins.pigpio import PiGPIOFactory
+
+                self._pinFactory = PiGPIOFactory()
+            except Exception as e:
+                self._log.warning(f"Could not use pigpio pin factory! ({e})")
+
+        if self._pinFactory is None:
+            self._pinFactory = gpiozero.Device._default_pin_factory()
+
+        gpiozero.Device.pin_factory = self._pinFactory
+        self._log.info("GPIO Zero pin factory: %s", type(self._pinFactory).__name__)
+
     def readConfigFile(self):
         """Read the config file."""
         try:
-            self._log.info(f"Reading configuration file... '{self.CONFIGFILE}'")
-            self.config = configparser.ConfigParser()
-            self.config.read(self.CONFIGFILE)
+            self._log.info("Reading configuration file... '%s'", self.CONFIGFILE)
+            # open the file directly, so that a missing file is reported as error
+            config = configparser.ConfigParser(interpolation=None)
+            with open(self.CONFIGFILE, encoding="utf-8") as configFile:
+                config.read_file(configFile)
+            if not config.has_section("GPIO"):
+                self._log.error("Invalid configuration file! (No [GPIO] section)")
+                return False
+            # keep only [GPIO] section as plain dictionary (option names in lower case)
+            self.configGPIO = dict(config["GPIO"])
+            for option in self.REQUIRED_OPTIONS:
+                if not self.configGPIO.get(option):
+                    self._log.error(
+                        f"Invalid configuration file! (Missing option '{option}')"
+                    )
+                    return False
             return True
+        except configparser.Error as e:
+            self._log.error(f"Invalid config file '{self.CONFIGFILE}'! ({e})")
+            return False
         except Exception as e:
             self._log.error(f"Accessing config file '{self.CONFIGFILE}' failed! ({e})")
             return False
 
     def validateStringInArray(self, paramName, configStr, validArray):
-        """Validate if configuration string is in array with valid strings
+        """Validate if configuration string is in dictionary with valid strings
         and return the respective index.
         """
-        try:
-            return validArray.index(configStr)
-        except Exception:
+        index = validArray.get(configStr, -1)
+        if index == -1:
             self._log.error(
                 "Invalid {0} configuration! Only one of {1} allowed!".format(
                     paramName, "/".join(validArray)
                 )
             )
-            return -1
+        return index
+
+    def validateGPIONumber(self, paramName, pinStr):
+        """Validate a BCM GPIO number string and return the number, or -1 if invalid."""
+        pinStr = pinStr.strip()
+        # isdigit() would also accept e.g. superscripts, which int() rejects
+        if pinStr.isascii() and pinStr.isdecimal():
+            pin = int(pinStr)
+            if pin <= self.MAX_GPIO:
+                return pin
+        self._log.error(
+            f"Invalid {paramName} pin '{pinStr}'! (only 0...{self.MAX_GPIO} allowed)"
+        )
+        return -1
 
     def getButtonConfig(self, buttonConfig):
         """Get button configuration from split string."""
@@ -168,7 +282,9 @@ class RaspiGPIOLightSwitch:
             self._log.error("Button configuration has too less or too many parameters!")
             return False
 
-        self._buttonPin = int(buttonConfig[0])
+        self._buttonPin = self.validateGPIONumber("button", buttonConfig[0])
+        if self._buttonPin == -1:
+            return False
 
         pudMode = self.validateStringInArray(
             "resistor", buttonConfig[1], self.VALUES_PULLUPDN
@@ -176,17 +292,7 @@ class RaspiGPIOLightSwitch:
         if pudMode == -1:
             return False
 
-        try:
-            pudSwitcher = {
-                0: (True, None),
-                1: (False, None),
-                2: (None, False),
-                3: (None, True),
-            }
-            self._pud, self._active = pudSwitcher[pudMode]
-        except Exception as e:
-            self._log.error(f"Could not convert pull resistor configuration! ({e})")
-            return False
+        self._pud, self._active = self.PUD_ACTIVE[pudMode]
 
         self._eventMode = self.validateStringInArray(
             "event", buttonConfig[2], self.VALUES_PRESS_RELEASE
@@ -197,8 +303,13 @@ class RaspiGPIOLightSwitch:
         if len(buttonConfig) == 4:
             try:
                 self._bouncetime = int(buttonConfig[3])
-            except Exception:
-                self._log.error("Invalid bounce time! (only integer >0 allowed)")
+                if not 0 < self._bouncetime <= self.MAX_BOUNCETIME:
+                    raise ValueError
+            except ValueError:
+                self._log.error(
+                    "Invalid bounce time! (only integer 1...%s allowed)",
+                    self.MAX_BOUNCETIME,
+                )
                 return False
         else:
             self._bouncetime = 100
@@ -236,25 +347,39 @@ class RaspiGPIOLightSwitch:
 
     def configureDimDirection(self, dimConfigLen, dimConfig):
         if dimConfigLen > 2:
-            dimDir = dimConfig[2].lower()
-            if dimDir == self.VALUES_DIMUPDN[1]:
-                self._dimStep = -self._dimStep
-            elif dimDir != self.VALUES_DIMUPDN[0]:
-                self._log.error("Invalid dim direction configuration!")
+            dimDir = self.validateStringInArray(
+                "dim direction", dimConfig[2].lower(), self.VALUES_DIMUPDN
+            )
+            if dimDir == -1:
                 return False
+            if dimDir == 1:
+                self._dimStep = -self._dimStep
+                self._dimDirStr = "dn"
         return True
 
     def configureDimHoldtime(self, dimConfigLen, dimConfig):
         if dimConfigLen > 3:
             try:
                 self._dimHoldSec = float(dimConfig[3])
-            except Exception:
+            except ValueError:
                 self._log.error("Invalid hold time!")
                 return False
         else:
             self._dimHoldSec = 1.5
         return True
 
+    def configureDimValues(self):
+        """Precompute the brightness corrected light value for each dim index
+        (index 0 is 'off')."""
+        if self._dimStep > 0:
+            dimValues = [i * self._dimStep for i in range(self._dimLevels + 1)]
+        else:
+            dimValues = [
+                1.0 + (i - 1) * self._dimStep for i in range(self._dimLevels + 1)
+            ]
+        dimValues[0] = 0.0
+        self._dimValues = tuple(pow(value, self._linExp) for value in dimValues)
+
     def getDimmingConfig(self, dimConfig):
         """Get dimming options from config split string."""
         self._dimMode = int(dimConfig[0])
@@ -283,12 +408,19 @@ class RaspiGPIOLightSwitch:
         """Create GPIO Zero button object and configure its event handlers."""
         # -------- create button object --------
         try:
-            self._log.debug(self._buttonPin, self._pud, self._active, self._bouncetime)
+            self._log.debug(
+                "Button: pin %s, pull_up %s, active_state %s, bounce time %sms",
+                self._buttonPin,
+                self._pud,
+                self._active,
+                self._bouncetime,
+            )
             self._button = gpiozero.Button(
                 self._buttonPin,
                 pull_up=self._pud,
                 active_state=self._active,
                 bounce_time=0.001 * self._bouncetime,
+                pin_factory=self._pinFactory,
             )
         except Exception as e:
             self._log.error(f"Error while setting up GPIO input for button! ({e})")
@@ -311,7 +443,9 @@ class RaspiGPIOLightSwitch:
     def createAndConfigureLight(self, lightConfig):
         """Create GPIO Zero LED object and configure dim brightness correction."""
         try:
-            lightPin = int(lightConfig[0])
+            lightPin = self.validateGPIONumber("light", lightConfig[0])
+            if lightPin == -1:
+                return False
 
             if len(lightConfig) == 2:
                 self._linExp = float(lightConfig[1])
@@ -325,9 +459,11 @@ class RaspiGPIOLightSwitch:
                 self._linExp = 1.0
 
             if self._dimMode == 0:
-                self._light = gpiozero.LED(lightPin)
+                self._light = gpiozero.LED(lightPin, pin_factory=self._pinFactory)
             else:
-                self._light = gpiozero.PWMLED(lightPin, frequency=400)
+                self._light = gpiozero.PWMLED(
+                    lightPin, frequency=400, pin_factory=self._pinFactory
+                )
             return True
         except Exception as e:
             self._log.error(f"Error while setting up GPIO output for light! ({e})")
@@ -338,12 +474,13 @@ class RaspiGPIOLightSwitch:
         set the GPIO input and output.
         """
         self._log.info("Init GPIO configuration.")
-        configGPIO = self.config["GPIO"]
+        configGPIO = self.configGPIO
 
         # -------- get button configuration --------
-        self._log.info("Button configuration = '{0}'".format(configGPIO["Button"]))
+        buttonStr = configGPIO["button"]
+        self._log.info("Button configuration = '%s'", buttonStr)
 
-        buttonConfig = configGPIO["Button"].lower().split(",")
+        buttonConfig = buttonStr.lower().split(",")
 
         if not self.getButtonConfig(buttonConfig):
             return False
@@ -353,11 +490,13 @@ class RaspiGPIOLightSwitch:
         self._dimIndex = 1
         self._dimLevels = 1
         self._dimStep = 1.0
+        self._dimDirStr = "up"
 
-        if self.config.has_option("GPIO", "Dim"):
-            self._log.info("Dimming configuration = '{0}'".format(configGPIO["Dim"]))
+        dimStr = configGPIO.get("dim")
+        if dimStr:
+            self._log.info("Dimming configuration = '%s'", dimStr)
 
-            dimConfig = configGPIO["Dim"].lower().split(",")
+            dimConfig = dimStr.lower().split(",")
 
             if not self.getDimmingConfig(dimConfig):
                 return False
@@ -367,13 +506,16 @@ class RaspiGPIOLightSwitch:
             return False
 
         # -------- create and configure light object --------
-        self._log.info("Light configuration = '{0}'".format(configGPIO["Light"]))
+        lightStr = configGPIO["light"]
+        self._log.info("Light configuration = '%s'", lightStr)
 
-        lightConfig = configGPIO["Light"].split(",")
+        lightConfig = lightStr.split(",")
 
         if not self.createAndConfigureLight(lightConfig):
             return False
 
+        self.configureDimValues()
+
         self.isValidGPIO = True
         return True
 
@@ -383,20 +525,24 @@ class RaspiGPIOLightSwitch:
             return
 
         try:
-            if pathlib.Path(self.STATEFILE).exists():
-                self._log.info(f"Reading state file... '{self.STATEFILE}'")
-                with open(self.STATEFILE, "r") as sf:
-                    stored_value = float(sf.read())
-                if stored_value > self._dimLevels:
-                    stored_value = self._dimLevels
-                self._dimIndex = stored_value
-                self._log.info(
-                    f"Restored dim level {100.0*self._dimIndex/self._dimLevels}%."
-                )
-            else:
-                self._log.info("No state file found, setting default value 100%.")
-                self._dimIndex = self._dimLevels
-                self._log.debug(f"-> dimIndex {self._dimIndex}")
+            self._log.info("Reading state file... '%s'", self.STATEFILE)
+            fd = os.open(self.STATEFILE, os.O_RDONLY)
+            try:
+                stored_value = int(float(os.read(fd, 32)))
+            finally:
+                os.close(fd)
+            if stored_value > self._dimLevels:
+                stored_value = self._dimLevels
+            elif stored_value < 0:
+                stored_value = 0
+            self._dimIndex = stored_value
+            self._log.info(
+                f"Restored dim level {100.0*self._dimIndex/self._dimLevels}%."
+            )
+        except FileNotFoundError:
+            self._log.info("No state file found, setting default value 100%.")
+            self._dimIndex = self._dimLevels
+            self._log.debug("-> dimIndex %s", self._dimIndex)
         except Exception as e:
             self._log.error(f"Reading state file '{self.STATEFILE}' failed! ({e})")
 
@@ -407,148 +553,204 @@ class RaspiGPIOLightSwitch:
                 f"Setting up state machine... (d={self._dimMode},e={self._eventMode})"
             )
 
-            self._stateMachine = (
-                self.STATES[self._dimMode][self._eventMode],
-                self.ACTIONS[self._dimMode][self._eventMode],
+            # flatten transitions to one table indexed by source state and event
+            transitions = array.array("b", [-1] * (self.NUM_STATES * self.NUM_EVENTS))
+            for event, targets in enumerate(
+                self.STATES[self._dimMode][self._eventMode]
+            ):
+                for source, target in targets.items():
+                    transitions[source * self.NUM_EVENTS + event] = target
+
+            # resolve special target 9 (dim mode 1) into two tables:
+            # dim one step further, or switch off when last dim level is reached
+            stepTarget = 2 if self._eventMode == 1 else 1
+            offTarget = (3, 0, 4, 5)[self._eventMode]
+            transitionsDim = array.array(
+                "b", (stepTarget if t == 9 else t for t in transitions)
+            )
+            transitionsOff = array.array(
+                "b", (offTarget if t == 9 else t for t in transitions)
+            )
+
+            # validate once that every reachable target state has an action
+            actions = self.ACTIONS[self._dimMode][self._eventMode]
+            for target in transitionsDim + transitionsOff:
+                if target != -1 and actions[target] is None:
+                    raise ValueError(f"No action defined for state {target}!")
+
+            self._transitions = (transitionsDim, transitionsOff)
+
+            # dim mode 2 saves the dim level, decided once instead of on every press
+            if self._dimMode == 2:
+                actionDim = self.actionDimAndSave
+            else:
+                actionDim = self.actionDim
+            # store the bound action method of each state, None for no action
+            actionMethods = (self.actionOff, self.actionOn, actionDim)
+            self._stateActions = tuple(
+                actionMethods[a] if a is not None and a >= 0 else None
+                for a in actions
             )
-            self._actions = [self.actionOff, self.actionOn, self.actionDim]
             self._current_state = 0
-            # print(self._stateMachine)
+            return True
         except Exception as e:
             self._log.error(f"Error in state machine set-up! ({e})")
+            return False
 
     def getNextStateNumber(self, event, current):
         """Return the next state number based on the button event
         and the current state."""
-        try:
+        # select table switching off instead of dimming at last dim level
+        transitions = self._transitions[self._dimIndex >= self._dimLevels]
+        next_temp = transitions[current * self.NUM_EVENTS + event]
+        if self._debug:
             self._log.debug(
-                f"Get next state for event {event} and current state {current}:"
+                "Next state for event %s and current state %s: %s (%s/%s)",
+                event,
+                current,
+                next_temp,
+                self._dimIndex,
+                self._dimLevels,
             )
-            next_temp = self._stateMachine[0][event][current]
-            self._log.debug(f"Temporary next: {next_temp}")
-            if next_temp == 9:
-                self._log.debug(
-                    f"- Special case 9... {self._dimIndex}/{self._dimLevels} -"
-                )
-                if self._dimIndex < self._dimLevels:
-                    # dim up/down
-                    self._log.debug("-- dim up/down --")
-                    next_temp = 2 if self._eventMode == 1 else 1
-                else:
-                    # off
-                    self._log.debug("-- light off --")
-                    next_temp = {0: 3, 1: 0, 2: 4, 3: 5}[self._eventMode]
-                    self._dimIndex = 0
-            return next_temp
-        except Exception as e:
-            self._log.error(f"Error while getting next state number! ({e})")
-            return -1
+        if next_temp == -1:
+            self._log.error(f"No transition for event {event} in state {current}!")
+        return next_temp
 
     def setNextState(self, next_state):
         """Determine and perform the allocated action for the requested next state,
         and finally set this state."""
-        try:
-            action = self._stateMachine[1][next_state]
-            self._log.debug(f"Select action for next state '{next_state}' --> {action}")
-            if action is not None:
-                self._log.debug(f"Next state '{next_state}' --> action '{action}'")
-                if action >= 0:
-                    action_call = self._actions[action]
-                    action_call()
-                self._current_state = next_state
-            else:
-                raise ValueError("Action was None!?")
-        except Exception as e:
-            self._log.error(f"Setting next state '{next_state}' failed! ({e})")
-            self._current_state = 0
+        # actions of all target states were validated in setupStateMachine
+        action = self._stateActions[next_state]
+        if self._debug:
+            self._log.debug(
+                "Next state '%s' --> action '%s'",
+                next_state,
+                action.__name__ if action else None,
+            )
+        if action is not None:
+            action()
+        self._current_state = next_state
 
     def handleButtonEvent(self, event):
         """General handling method for one of the button events."""
-        self._log.debug(f"Handle button event {event}...")
-        next_state = self.getNextStateNumber(event, self._current_state)
-        self._log.debug(
-            f"Current: {self._current_state} event {event} --> Next: {next_state}"
-        )
-        if next_state >= 0:
-            self.setNextState(next_state)
-        else:
-            self._log.error("Try resetting current state to 0...")
-            self._current_state = 0
+        try:
+            next_state = self.getNextStateNumber(event, self._current_state)
+            if next_state >= 0:
+                self.setNextState(next_state)
+                return
+        except Exception as e:
+            self._log.error(f"Handling button event {event} failed! ({e})")
+
+        self._log.error("Try resetting current state to 0...")
+        self._current_state = 0
 
     def handleWhenReleased(self):
         """Event handler for when_released."""
-        self._log.debug("- when_released event -")
         self.handleButtonEvent(self.EVENT_RELEASE)
 
     def handleWhenPressed(self):
         """Event handler for when_pressed."""
-        self._log.debug("- when_pressed event -")
         self.handleButtonEvent(self.EVENT_PRESS)
 
     def handleWhenHeld(self):
         """Event handler for when_held."""
-        self._log.debug("- when_held event -")
         self.handleButtonEvent(self.EVENT_HOLD)
 
-    def setLightToLevel(self, new_value):
-        """Set the light to a new value (0...1) and then log its new state."""
-        try:
-            if self._linExp == 1.0:
-                self._light.value = new_value
-            else:
-                self._light.value = pow(new_value, self._linExp)
+    def setLightToLevel(self, level):
+        """Set the light to a new, already corrected value (0...1)
+        and then log its new state."""
+        self._light.value = level
 
-            if self._light.is_lit:
-                self._log.info(f"Light is on now at {100 * self._light.value}%.")
-            else:
-                self._log.info("Light is off now.")
-        except Exception:
-            self._log.error(f"Could not set new light value {100 * new_value}%!")
+        # the written level determines the light state, no need to read it back
+        if level > 0:
+            # formatted by logging only if the record is emitted
+            self._log.info("Light is on now at %s%%.", 100 * level)
+        else:
+            self._log.info("Light is off now.")
 
     def writeStateFile(self):
         """Write the current dim level index to the state file."""
         try:
-            self._log.debug(f"Writing state file... '{self.STATEFILE}'")
-            with open(self.STATEFILE, "w") as sf:
-                sf.write(str(self._dimIndex))
+            self._log.debug("Writing state file... '%s'", self.STATEFILE)
+            # write to a temporary file and rename it, so that an interrupted
+            # write never leaves a truncated state file behind
+            tmpFile = self.STATEFILE + ".tmp"
+            fd = os.open(tmpFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(fd, str(self._dimIndex).encode())
+            finally:
+                os.close(fd)
+            os.replace(tmpFile, self.STATEFILE)
         except Exception as e:
             self._log.error(f"Writing state file '{self.STATEFILE}' failed! ({e})")
 
+    def scheduleStateFile(self):
+        """Write the state file when dimming paused for longer than the hold time,
+        so that all dim steps of one button hold result in one write only.
+        """
+        stateTimer = self._stateTimer
+        if stateTimer is not None:
+            stateTimer.cancel()
+        # hold repeats come every hold time, restart the delay on each dim step
+        self._stateTimer = threading.Timer(
+            self._dimHoldSec + self.STATEFILE_DELAY, self.handleStateFileTimer
+        )
+        self._stateTimer.start()
+
+    def handleStateFileTimer(self):
+        """Timer handler to write the latest dim level index to the state file."""
+        # a dim step may have restarted the timer meanwhile
+        if self._stateTimer is threading.current_thread():
+            self._stateTimer = None
+        self.writeStateFile()
+
+    def flushStateFile(self):
+        """Write a scheduled state file update immediately."""
+        stateTimer = self._stateTimer
+        if stateTimer is not None:
+            stateTimer.cancel()
+            self._stateTimer = None
+            self.writeStateFile()
+
     def actionOff(self):
         """Action function to switch the light off."""
-        self._log.info("Action: light off")
+        if self._debug:
+            self._log.debug("Action: light off")
         self.setLightToLevel(0.0)
 
     def actionOn(self):
         """Action function to switch the light on and restore its previous dim level."""
-        self._log.info("Action: light on (restore previous dim level)")
-        self._log.debug(
-            f"dimStep {self._dimStep}  dimIndex {self._dimIndex}  dimMode {self._dimMode}"
-        )
-        if self._dimStep > 0:
-            next_value = self._dimIndex * self._dimStep
-        else:
-            next_value = 1.0 + (self._dimIndex - 1) * self._dimStep
-
-        self.setLightToLevel(next_value)
+        if self._debug:
+            self._log.debug("Action: light on (restore previous dim level)")
+            self._log.debug(
+                "dimStep %s  dimIndex %s  dimMode %s",
+                self._dimStep,
+                self._dimIndex,
+                self._dimMode,
+            )
+        self.setLightToLevel(self._dimValues[self._dimIndex])
 
     def actionDim(self):
         """Action function to dim the light one step up or down."""
-        self._log.info("Action: dim light one step up/dn")
-        self._dimIndex += 1
-        if self._dimIndex > self._dimLevels:
-            self._dimIndex = 1
+        if self._debug:
+            self._log.debug("Action: dim light one step %s", self._dimDirStr)
+        # next dim level, wrapping around from dimLevels to 1
+        self._dimIndex = self._dimIndex % self._dimLevels + 1
 
-        if self._dimStep > 0:
-            next_value = self._dimIndex * self._dimStep
-        else:
-            next_value = 1.0 + (self._dimIndex - 1) * self._dimStep
+        next_value = self._dimValues[self._dimIndex]
 
-        self._log.debug(f"next_value {next_value}  dimIndex {self._dimIndex}")
+        if self._debug:
+            self._log.debug("next_value %s  dimIndex %s", next_value, self._dimIndex)
         self.setLightToLevel(next_value)
 
-        if self._dimMode == 2:
-            self.writeStateFile()
+    def actionDimAndSave(self):
+        """Action function to dim the light one step and save the new dim level."""
+        self.actionDim()
+        self.scheduleStateFile()
+
+    def closeButton(self):
+        """Close the button input, so that no further events are handled."""
+        self._button.close()
 
     def switchLightOff(self):
         """Switch the output pin off."""
@@ -556,48 +758,62 @@ class RaspiGPIOLightSwitch:
         self._log.info("Light is off now.")
 
 
+# set on SIGTERM to leave the service loop
+stop_event = threading.Event()
+
+
 def sigterm_handler(_signo, _stack_frame):
     """Clean exit on SIGTERM signal (when systemd stops the process)."""
-    sys.exit(0)
+    stop_event.set()
 
 
-# install handler
-signal.signal(signal.SIGTERM, sigterm_handler)
+def main():
+    """Set up the light switch service and run it until SIGTERM."""
+    # install handler
+    signal.signal(signal.SIGTERM, sigterm_handler)
 
-log = None
-lightswitch = None
+    log = None
+    lightswitch = None
 
-try:
-    log = logging.getLogger(__name__)
+    try:
+        log = logging.getLogger(__name__)
+
+        lightswitch = RaspiGPIOLightSwitch()
+        lightswitch.initLogging(log)
+        lightswitch.initPinFactory()
 
-    lightswitch = RaspiGPIOLightSwitch()
-    lightswitch.initLogging(log)
+        if not lightswitch.readConfigFile():
+            sys.exit(-2)
 
-    if not lightswitch.readConfigFile():
-        sys.exit(-2)
+        if not lightswitch.initGPIO():
+            log.error("Init GPIO failed!")
+            sys.exit(-3)
 
-    if not lightswitch.config["GPIO"]:
-        log.error("Invalid configuration file! (No [GPIO] section)")
-        sys.exit(-3)
+        lightswitch.readStateFile()
 
-    if not lightswitch.initGPIO():
-        log.error("Init GPIO failed!")
-        sys.exit(-3)
+        if not lightswitch.setupStateMachine():
+            log.error("Setting up state machine failed!")
+            sys.exit(-4)
 
-    lightswitch.readStateFile()
+        log.info("Enter raspi-gpio-lightswitch service loop...")
+        # button events are handled by GPIO Zero threads, just wait for SIGTERM
+        stop_event.wait()
 
-    lightswitch.setupStateMachine()
+    except Exception as e:
+        if log is not None:
+            log.exception(f"Unhandled exception: {e}")
+        sys.exit(-1)
+    finally:
+        if lightswitch is not None and lightswitch.isValidGPIO:
+            # stop button events first, so they cannot change light or state anymore
+            lightswitch.closeButton()
+            lightswitch.flushStateFile()
+            if log is not None:
+                log.info("Finally setting output to off state.")
+            lightswitch.switchLightOff()
+        if lightswitch is not None:
+            lightswitch.stopLogging()
 
-    log.info("Enter raspi-gpio-lightswitch service loop...")
-    while True:
-        time.sleep(0.1)
 
-except Exception as e:
-    if log:
-        log.exception(f"Unhandled exception: {e}")
-    sys.exit(-1)
-finally:
-    if lightswitch and lightswitch.isValidGPIO:
-        if log:
-            log.info("Finally setting output to off state.")
-        lightswitch.switchLightOff()
+if __name__ == "__main__":
+    main()